@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os, logging, requests, asyncio
-from bs4 import BeautifulSoup
+import os, re, html, json, logging, requests, asyncio
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from telegram import Bot
 
 # ——— LOGGING —————————————————————————————————————————————————————————————
@@ -19,120 +23,231 @@ try:
 except ValueError:
     logging.error("CHAT_ID must be integer")
     exit(1)
-
-bot = Bot(token=TOKEN)
+# Boş/0: tek sefer çalış (cron). >0: süreç açık kalır, bu kadar saniyede bir yoklar
+try:
+    POLL_INTERVAL = int(os.getenv("POLL_INTERVAL") or 0)
+except ValueError:
+    logging.error("POLL_INTERVAL must be integer")
+    exit(1)
+if POLL_INTERVAL < 0:
+    logging.error("POLL_INTERVAL must not be negative")
+    exit(1)
 
 # ——— CONSTANTS —————————————————————————————————————————————————————————————
-CITIES       = ["ISTANBUL", "IZMIR", "MANISA"]
+CITIES       = ("ISTANBUL", "IZMIR", "MANISA")
 MAX_MESSAGES = 20
 STATE_FILE   = "last_id.txt"
+CACHE_FILE   = "last_fetch.json"
+HEADER_LINES = 6
 SOURCE_URL   = "http://www.koeri.boun.edu.tr/scripts/lst9.asp"
+SOURCE_ENC   = "iso-8859-9"
+
+# ——— HTTP SESSION ——————————————————————————————————————————————————————————
+# Tek oturum: bağlantı havuzu + keep-alive, geçici hatalarda yeniden deneme
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(
+    pool_connections=1, pool_maxsize=4,
+    max_retries=Retry(total=2, backoff_factor=0.3),
+))
+# sıkıştırılmış yanıtı iste; requests'in varsayılanı (br/zstd dahil) varsa daraltma
+if "gzip" not in _SESSION.headers.get("Accept-Encoding", ""):
+    _SESSION.headers["Accept-Encoding"] = "gzip, deflate"
 
 # ——— HELPERS ——————————————————————————————————————————————————————————————
 
+# Türkçe harfler + ASCII küçük harfler tek geçişte ASCII büyük harfe
+_NORM_TABLE = str.maketrans(
+    "İıiŞşĞğÜüÖöÇç" + "abcdefghjklmnopqrstuvwxyz",
+    "IIISSGGUUOOCC" + "ABCDEFGHJKLMNOPQRSTUVWXYZ",
+)
+
+@lru_cache(maxsize=1024)  # artçı depremlerde aynı yer adları tekrar eder
 def normalize(text: str) -> str:
-    return (text.upper()
-            .replace("İ","I").replace("ı","I")
-            .replace("Ş","S").replace("Ğ","G")
-            .replace("Ü","U").replace("Ö","O")
-            .replace("Ç","C"))
+    return text.translate(_NORM_TABLE)
+
+# Tüm şehirler tek geçişte aranır (şehir başına ayrı substring taraması yerine)
+_CITY_RE = re.compile("|".join(map(re.escape, CITIES)))
 
-def fetch_data() -> list[str]:
+_PRE_RE = re.compile(rb"<pre[^>]*>(.*?)</pre>", re.S | re.I)
+
+def fetch_data() -> tuple[str|None, dict]:
+    # (metin, yanıt başlıkları); doğrulayıcılar işlem bitince kaydedilir
     try:
-        r = requests.get(SOURCE_URL, timeout=10); r.raise_for_status()
-        r.encoding = "iso-8859-9"
+        r = _SESSION.get(SOURCE_URL, timeout=10, headers=load_validators()); r.raise_for_status()
     except Exception as e:
         logging.error(f"Fetch failed: {e}")
-        return []
-    pre = BeautifulSoup(r.text, "html.parser").find("pre")
-    return pre.text.splitlines()[6:] if pre else []
-
-def parse_line(line: str) -> dict|None:
-    p = line.split()
-    if len(p)<10: return None
-    return {
-      "date":  p[0], "time": p[1],
-      "lat":   p[2], "lon":   p[3],
-      "depth": p[4], "mag":   p[6],
-      "place": " ".join(p[9:])
-    }
-
-def load_last_id() -> str:
-    return open(STATE_FILE).read().strip() if os.path.exists(STATE_FILE) else ""
-
-def save_last_id(eid: str):
-    with open(STATE_FILE,"w") as f: f.write(eid)
-
-def filter_new(lines, last_id):
-    found = []
-    for line in lines:
-        data = parse_line(line)
-        if not data: continue
-        if not any(c in normalize(data["place"]) for c in CITIES):
+        return "", {}
+    if r.status_code == 304: return None, {}  # son çekimden beri değişmedi
+    # sayfada tek bir <pre> var: HTML ağacı kurmadan byte seviyesinde kes
+    m = _PRE_RE.search(r.content)
+    if not m: return "", {}
+    return skip_header(html.unescape(m.group(1).decode(SOURCE_ENC))), r.headers
+
+def skip_header(text: str) -> str:
+    # başlık satırlarını ayrı string'lere bölmeden atla
+    start = 0
+    for _ in range(HEADER_LINES):
+        start = text.find("\n", start) + 1
+        if not start: return ""
+    return text[start:]
+
+# Sabit kolonlu satır: tarih saat enlem boylam derinlik MD ML Mw ? yer...
+# (10'dan az kolonlu başlık satırları eşleşmez)
+_LINE_RE = re.compile(
+    r"^[ \t]*(?P<date>\S+)[ \t]+(?P<time>\S+)[ \t]+(?P<lat>\S+)[ \t]+(?P<lon>\S+)"
+    r"[ \t]+(?P<depth>\S+)[ \t]+\S+[ \t]+(?P<mag>\S+)[ \t]+\S+[ \t]+\S+"
+    r"[ \t]+(?P<place>\S.*?)[ \t\r]*$",
+    re.M,
+)
+
+class Quake(NamedTuple):
+    date:  str
+    time:  str
+    lat:   str
+    lon:   str
+    depth: str
+    mag:   str
+    place: str
+
+def parse_match(m: re.Match) -> Quake:
+    date, time, lat, lon, depth, mag, place = m.groups()
+    return Quake(date, time, lat, lon, depth, mag, " ".join(place.split()))
+
+# Olay anahtarı (tarih, saat); dosyada ve mesajda "tarih_saat" olarak yazılır
+def format_eid(key: tuple[str, str]) -> str:
+    return "_".join(key)
+
+def load_last_id() -> tuple[str, str]:
+    try:
+        date, _, time = Path(STATE_FILE).read_text().strip().partition("_")
+    except FileNotFoundError:
+        return ("", "")
+    return (date, time)
+
+def save_last_id(key: tuple[str, str]):
+    Path(STATE_FILE).write_text(format_eid(key))
+
+def load_validators() -> dict[str, str]:
+    # koşullu GET başlıkları (If-None-Match / If-Modified-Since)
+    try:
+        return json.loads(Path(CACHE_FILE).read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_validators(headers):
+    validators = {}
+    if "ETag" in headers:          validators["If-None-Match"]     = headers["ETag"]
+    if "Last-Modified" in headers: validators["If-Modified-Since"] = headers["Last-Modified"]
+    Path(CACHE_FILE).write_text(json.dumps(validators))
+
+def format_event(key: tuple[str, str], q: Quake) -> str:
+    return (
+        f"📌 {q.place}\n"
+        f"   🗓 {q.date} {q.time} (TSİ)\n"
+        f"   🌋 {q.mag} ML — 📏 {q.depth} km\n"
+        f"   📍 {q.lat}, {q.lon}\n"
+        f"<code>#ID: {format_eid(key)}</code>"
+    )
+
+def collect_new(text, last_id) -> tuple[dict[str, list[str]], tuple[str, str]|None]:
+    # filtreleme + şehre göre gruplama + biçimlendirme tek geçişte;
+    # akış yeniden eskiye sıralı, ilk eşleşen anahtar en yenisidir
+    per_city = {city: [] for city in CITIES}
+    latest, count = None, 0
+    for m in _LINE_RE.finditer(text):
+        # ön eleme: Quake kurmadan önce ham yer alanında şehir ara
+        city = _CITY_RE.search(normalize(m["place"]))
+        if not city:
             continue
-        eid = f"{data['date']}_{data['time']}"
-        if eid == last_id: break
-        found.append((eid,data))
-        if len(found)>=MAX_MESSAGES: break
-    return list(reversed(found))
-
-def group_by_city(events):
-    groups = {city: [] for city in CITIES}
-    for eid, d in events:
-        norm = normalize(d["place"])
-        for city in CITIES:
-            if city in norm:
-                groups[city].append((eid,d))
-                break
-    return groups
-
-def build_grouped_message(groups: dict[str, list[tuple[str,dict]]]) -> str:
+        q = parse_match(m)
+        key = (q.date, q.time)
+        if key == last_id: break
+        latest = latest or key
+        per_city[city[0]].append(format_event(key, q))
+        count += 1
+        if count>=MAX_MESSAGES: break
+    return per_city, latest
+
+def build_grouped_message(per_city: dict[str, list[str]]) -> str:
     header = "🛰️ <b>Yeni Deprem Bildirimleri</b> 🛰️\n\n"
     body_parts = []
     emojis = {"ISTANBUL":"🌆", "IZMIR":"🏖️", "MANISA":"🌄"}
     for city in CITIES:
-        evs = groups.get(city, [])
+        evs = per_city.get(city, [])
         if not evs:
             continue
         body_parts.append(f"{emojis.get(city,'📍')} <b>{city.title()}</b> <em>({len(evs)})</em>")
-        for eid, d in evs:
-            body_parts.append(
-                f"📌 {d['place']}\n"
-                f"   🗓 {d['date']} {d['time']} (TSİ)\n"
-                f"   🌋 {d['mag']} ML — 📏 {d['depth']} km\n"
-                f"   📍 {d['lat']}, {d['lon']}\n"
-                f"<code>#ID: {eid}</code>"
-            )
+        body_parts.extend(reversed(evs))  # eskiden yeniye
         body_parts.append("")  # şehirler arası boşluk
     return header + "\n".join(body_parts).strip()
 
-def send_text(text):
-    async def _send(): 
-        await bot.send_message(chat_id=CHAT_ID, text=text, parse_mode="HTML")
+# Süreç boyunca tek Bot: Telegram'a açılan TCP+TLS bağlantısı turlar arasında korunur.
+# İlk gönderimde açılır; gönderilecek bir şey yoksa Telegram'a hiç bağlanılmaz.
+_BOT: Bot|None = None
+
+async def get_bot() -> Bot:
+    global _BOT
+    if _BOT is None:
+        bot = Bot(token=TOKEN)
+        await bot.initialize()
+        _BOT = bot
+    return _BOT
+
+async def close_bot():
+    global _BOT
+    if _BOT is not None:
+        await _BOT.shutdown()
+        _BOT = None
+
+async def send_text(text):
     try:
-        asyncio.run(_send())
+        bot = await get_bot()
+        await bot.send_message(chat_id=CHAT_ID, text=text, parse_mode="HTML")
         logging.info("Aggregated message sent.")
     except Exception as e:
         logging.error(f"Send failed: {e}")
 
-def main():
-    lines   = fetch_data()
-    if not lines:
+async def run_once():
+    # ağ isteği ve durum dosyası okuması birbirinden bağımsız: paralel çalıştır
+    (text, headers), last_id = await asyncio.gather(
+        asyncio.to_thread(fetch_data), asyncio.to_thread(load_last_id)
+    )
+    if text is None:
+        logging.info("Feed not modified.")
+        return
+    if not text:
         logging.info("No data.")
         return
 
-    last_id = load_last_id()
-    new_qs  = filter_new(lines, last_id)
-    if not new_qs:
+    per_city, latest = collect_new(text, last_id)
+    if latest is None:
         logging.info("No new quakes.")
+        save_validators(headers)
         return
 
-    groups = group_by_city(new_qs)
-    msg    = build_grouped_message(groups)
+    msg    = build_grouped_message(per_city)
     print(msg)       # konsolda kontrol için
-    send_text(msg)   # Telegram’a gönder
+    await send_text(msg)   # Telegram’a gönder
     # en son ID
-    save_last_id(new_qs[-1][0])
+    save_last_id(latest)
+    # ETag/Last-Modified ancak durum kaydedildikten sonra: arada hata olursa
+    # sonraki tur 304 almaz, aynı akışı yeniden dener
+    save_validators(headers)
+
+async def main():
+    try:
+        if not POLL_INTERVAL:
+            await run_once()
+            return
+        while True:
+            # servis modunda tek turdaki hata süreci düşürmesin
+            try:
+                await run_once()
+            except Exception as e:
+                logging.error(f"Run failed: {e}")
+            await asyncio.sleep(POLL_INTERVAL)
+    finally:
+        await close_bot()
 
 if __name__=="__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file